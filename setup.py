@@ -20,8 +20,11 @@ setup(
     ],
     py_modules=['sqs_list_filled_queues'],
     install_requires=[
-        'boto3',
+        'boto3>=1.34',
     ],
+    extras_require={
+        're2': ['google-re2'],
+    },
     entry_points={
         'console_scripts': [
             'sqs-list-filled-queues = sqs_list_filled_queues:main',
@@ -1,115 +1,223 @@
 #!/usr/bin/env python3
 import boto3
-import urllib.parse
+from botocore.config import Config
+from urllib.parse import quote_from_bytes
 from concurrent.futures import ThreadPoolExecutor, as_completed
+import functools
+import io
+from operator import itemgetter
 import os
 import re
-import select
+import selectors
+import shutil
+import signal
 import sys
 import termios
 import tty
 import argparse
 
-sqs = boto3.client('sqs')
+try:
+    import re2
+except ImportError:
+    re2 = None
 
-def check_queue(queue_url, include_in_flight=False):
-    try:
-        attribute_names = ['ApproximateNumberOfMessages']
-        if include_in_flight:
-            attribute_names.append('ApproximateNumberOfMessagesNotVisible')
+def create_sqs_client(workers):
+    """Create an SQS client whose connection pool can serve all workers."""
+    config = Config(
+        max_pool_connections=max(workers, 10),
+        retries={'mode': 'adaptive'},
+    )
+    sqs = boto3.client('sqs', config=config)
+    # Load the lazily built operation model now so worker threads don't
+    # race on it during the first fan-out
+    sqs.meta.service_model.operation_model('GetQueueAttributes')
+    return sqs
+
+def list_queues(sqs):
+    """Return (queue_name, queue_url) tuples for all queues.
+
+    Follows pagination beyond 1000 queues. The name is split off the URL
+    here once so later stages never have to.
+    """
+    paginator = sqs.get_paginator('list_queues')
+    # SQS only returns a NextToken when MaxResults is set, so a page size is required
+    pages = paginator.paginate(PaginationConfig={'PageSize': 1000})
+    return [(url.rpartition('/')[2], url) for page in pages for url in page.get('QueueUrls', [])]
+
+# Queue attributes to request, and getters for them, with and without in-flight messages
+BASIC_ATTRIBUTES = ('ApproximateNumberOfMessages',)
+FULL_ATTRIBUTES = ('ApproximateNumberOfMessages', 'ApproximateNumberOfMessagesNotVisible')
+GET_FULL_ATTRIBUTES = itemgetter(*FULL_ATTRIBUTES)
 
+def check_queue(sqs, queue_name, queue_url, include_in_flight=False):
+    try:
         response = sqs.get_queue_attributes(
             QueueUrl=queue_url,
-            AttributeNames=attribute_names
+            AttributeNames=FULL_ATTRIBUTES if include_in_flight else BASIC_ATTRIBUTES
         )
     except sqs.exceptions.QueueDoesNotExist:
         # Ignore the queue if it does not exist
         return
 
-    message_count = int(response['Attributes']['ApproximateNumberOfMessages'])
-    in_flight_count = 0
+    attributes = response['Attributes']
     if include_in_flight:
-        in_flight_count = int(response['Attributes'].get('ApproximateNumberOfMessagesNotVisible', 0))
-
-    total_count = message_count + in_flight_count
+        message_count, in_flight_count = map(int, GET_FULL_ATTRIBUTES(attributes))
+    else:
+        message_count, in_flight_count = int(attributes['ApproximateNumberOfMessages']), 0
 
-    if total_count:
-        return (message_count, in_flight_count, queue_url)
+    # Empty queues return None so no result tuple is built for them
+    if message_count + in_flight_count == 0:
+        return None
+    return (message_count, in_flight_count, queue_name, queue_url)
 
 # ANSI escape codes for styles
 BOLD = "\033[1m"
 GREEN = "\033[92m"
 RESET = "\033[0m"
+CLEAR_LINE = "\r" + " " * 60 + "\r"
 
-def display_results(results, include_in_flight=False):
-    session = boto3.session.Session()
-    current_region = session.region_name
-    console_link = f"https://console.aws.amazon.com/sqs/v2/home?region={current_region}"
+def console_link_prefix(sqs):
+    """Return the AWS console URL prefix for queues in the client's region."""
+    return f"https://console.aws.amazon.com/sqs/v2/home?region={sqs.meta.region_name}#/queues/"
 
+@functools.lru_cache(maxsize=8)
+def row_formatter(name_width, count_width, in_flight_width, total_width, include_in_flight):
+    """Return a formatter for result rows with the given column widths.
+
+    Cached so that watch refreshes with unchanged widths reuse the same
+    template. Fields are name, msgs, in-flight, total and link.
+    """
+    if include_in_flight:
+        template = (f"{BOLD}{{0:<{name_width}}}{RESET}: {GREEN}{{1:>{count_width}}} msgs{RESET}, "
+                    f"{GREEN}{{2:>{in_flight_width}}} in-flight{RESET}, {GREEN}{{3:>{total_width}}} total{RESET}\n    {{4}}\n")
+    else:
+        template = f"{BOLD}{{0:<{name_width}}}{RESET}: {GREEN}{{1:>{count_width}}} msgs{RESET}\n    {{4}}\n"
+    return template.format
+
+# Terminal width in columns, kept current by track_terminal_size()
+terminal_columns = None
+
+def track_terminal_size():
+    """Record the terminal width now and again whenever the terminal is resized."""
+    def update(signum=None, frame=None):
+        global terminal_columns
+        terminal_columns = shutil.get_terminal_size().columns
+    update()
+    signal.signal(signal.SIGWINCH, update)
+
+def display_results(results, console_prefix, include_in_flight=False, max_link_length=None):
     displayable_results = []
+    # Track the column maxima while building the rows instead of rescanning them
+    max_base_name_length = max_message_count = max_in_flight_count = max_total_count = 0
     for result in results:
-        message_count, in_flight_count, queue_url = result
-        base_name = queue_url.split('/')[-1]
-        link = f"{console_link}#/queues/{urllib.parse.quote(queue_url, safe='')}"
+        message_count, in_flight_count, base_name, queue_url = result
+        # Queue URLs are ASCII, so encode directly and skip quote()'s str handling
+        link = console_prefix + quote_from_bytes(queue_url.encode('ascii'), safe=b'')
+        if max_link_length is not None and len(link) > max_link_length:
+            link = link[:max_link_length - 1] + '…'
         total_count = message_count + in_flight_count
         displayable_results.append((base_name, message_count, in_flight_count, total_count, link))
+        if len(base_name) > max_base_name_length:
+            max_base_name_length = len(base_name)
+        if message_count > max_message_count:
+            max_message_count = message_count
+        if in_flight_count > max_in_flight_count:
+            max_in_flight_count = in_flight_count
+        if total_count > max_total_count:
+            max_total_count = total_count
 
     sorted_display_results = sorted(displayable_results, key=lambda x: (-x[3], x[0]))  # Sort by total count desc, then name
-    clear_line()
     if results:
-        max_base_name_length = max(len(result[0]) for result in sorted_display_results)
-        max_message_count_length = len(str(max(result[1] for result in sorted_display_results)))
-        max_in_flight_length = len(str(max(result[2] for result in sorted_display_results))) if include_in_flight else 0
-        max_total_length = len(str(max(result[3] for result in sorted_display_results)))
-
-        for base_name, message_count, in_flight_count, total_count, console_link in sorted_display_results:
-            display_name = base_name.ljust(max_base_name_length)
-            display_count = str(message_count).rjust(max_message_count_length)
-
-            if include_in_flight:
-                display_in_flight = str(in_flight_count).rjust(max_in_flight_length)
-                display_total = str(total_count).rjust(max_total_length)
-                print(f"{BOLD}{display_name}{RESET}: {GREEN}{display_count} msgs{RESET}, {GREEN}{display_in_flight} in-flight{RESET}, {GREEN}{display_total} total{RESET}\n    {console_link}")
-            else:
-                print(f"{BOLD}{display_name}{RESET}: {GREEN}{display_count} msgs{RESET}\n    {console_link}")
+        max_message_count_length = len(str(max_message_count))
+        max_in_flight_length = len(str(max_in_flight_count)) if include_in_flight else 0
+        max_total_length = len(str(max_total_count))
+
+        format_row = row_formatter(max_base_name_length, max_message_count_length,
+                                   max_in_flight_length, max_total_length, include_in_flight)
+        write_stdout(CLEAR_LINE + ''.join(format_row(*row) for row in sorted_display_results))
     else:
-        print(f"{BOLD}No messages found in any queue.{RESET}")
+        write_stdout(f"{CLEAR_LINE}{BOLD}No messages found in any queue.{RESET}\n")
+
+def write_stdout(text):
+    """Write text to stdout with a single write(2) where the OS allows it."""
+    sys.stdout.flush()
+    try:
+        fd = sys.stdout.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        sys.stdout.write(text)
+        return
+    buf = memoryview(text.encode(sys.stdout.encoding or 'utf-8', sys.stdout.errors or 'strict'))
+    while buf:
+        buf = buf[os.write(fd, buf):]
 
 def clear_line():
-    print("\r" + " " * 60, end='\r')
+    print(CLEAR_LINE, end='')
 
-def get_queue_infos(queue_urls, workers, include_in_flight=False):
-    total_queues = len(queue_urls)
+def clear_screen():
+    sys.stdout.write("\033[2J\033[H")
+    sys.stdout.flush()
+
+def get_queue_infos(sqs, queues, workers, include_in_flight=False):
+    total_queues = len(queues)
     results = []
     with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = [executor.submit(check_queue, url, include_in_flight) for url in queue_urls]
+        futures = [executor.submit(check_queue, sqs, name, url, include_in_flight) for name, url in queues]
         processed_queues = 0
+        # Redraw the progress line at most ~20 times rather than once per queue
+        progress_step = max(1, total_queues // 20)
         for future in as_completed(futures):
             processed_queues += 1
-            print(f"\rProcessed {BOLD}{processed_queues}{RESET} out of {BOLD}{total_queues}{RESET} queues...", end='', flush=True)
+            if processed_queues % progress_step == 0 or processed_queues == total_queues:
+                print(f"\rProcessed {BOLD}{processed_queues}{RESET} out of {BOLD}{total_queues}{RESET} queues...", end='', flush=True)
             result = future.result()
             if result:
                 results.append(result)
     return results
 
+# Upper bound for how many refresh cycles an empty queue may be skipped for
+MAX_BACKOFF = 8
+
+def select_due_queues(queues, backoff):
+    """Return the queues to poll in this cycle, counting down skipped ones."""
+    due_queues = []
+    for queue in queues:
+        state = backoff.get(queue[1])
+        if state and state[1] > 0:
+            state[1] -= 1
+        else:
+            due_queues.append(queue)
+    return due_queues
+
+def update_backoff(backoff, polled_queues, results):
+    """Double the polling interval of empty queues and reset filled ones."""
+    filled_urls = {result[3] for result in results}
+    for _, url in polled_queues:
+        if url in filled_urls:
+            backoff.pop(url, None)
+        else:
+            factor = min(backoff.get(url, [1])[0] * 2, MAX_BACKOFF)
+            backoff[url] = [factor, factor - 1]
+
 def countdown(duration):
     original_settings = termios.tcgetattr(sys.stdin)
     tty.setcbreak(sys.stdin.fileno())
 
     duration_len = len(str(duration))
     try:
-        for i in range(duration, 0, -1):
-            print(f"\rRefresh in {str(i).rjust(duration_len)} seconds (press 'R' to force refresh)", end='', flush=True)
-            rlist, _, _ = select.select([sys.stdin], [], [], 1)
-            if rlist:
-                key = sys.stdin.read(1).lower()
-                clear_line()
-                if key == 'r':
-                    return True
-                elif key == 'q':
-                    quit()
-            else:
-                continue
+        # Register stdin once and reuse the selector for every tick
+        with selectors.DefaultSelector() as selector:
+            selector.register(sys.stdin, selectors.EVENT_READ)
+            for i in range(duration, 0, -1):
+                print(f"\rRefresh in {str(i).rjust(duration_len)} seconds (press 'R' to force refresh)", end='', flush=True)
+                if selector.select(timeout=1):
+                    key = sys.stdin.read(1).lower()
+                    clear_line()
+                    if key == 'r':
+                        return True
+                    elif key == 'q':
+                        quit()
+                else:
+                    continue
     finally:
         termios.tcsetattr(sys.stdin, termios.TCSADRAIN, original_settings)
     return False
@@ -118,60 +226,93 @@ def quit():
     print(f"{BOLD}{GREEN}Program terminated by user.{RESET}")
     sys.exit(0)
 
-def filter_queues_by_pattern(queue_urls, pattern):
-    """Filter queue URLs by regex pattern applied to queue names."""
+def compile_pattern(pattern):
+    """Compile a case-insensitive queue name pattern.
+
+    Uses RE2 (linear-time matching) when installed and falls back to the
+    re module for syntax RE2 does not support, e.g. backreferences.
+    """
+    if re2 is not None:
+        try:
+            return re2.compile('(?i)' + pattern)
+        except re2.error:
+            pass
+    return re.compile(pattern, re.IGNORECASE)
+
+def filter_queues_by_pattern(queues, pattern):
+    """Filter (queue_name, queue_url) tuples by regex pattern applied to queue names."""
     if not pattern:
-        return queue_urls
+        return queues
 
     try:
-        regex = re.compile(pattern, re.IGNORECASE)
+        regex = compile_pattern(pattern)
     except re.error as e:
         print(f"Error: Invalid regex pattern '{pattern}': {e}")
         sys.exit(1)
 
-    filtered_urls = []
-    for url in queue_urls:
-        queue_name = url.split('/')[-1]  # Extract queue name from URL
-        if regex.search(queue_name):
-            filtered_urls.append(url)
+    return [queue for queue in queues if regex.search(queue[0])]
 
-    return filtered_urls
+def link_width_limit():
+    """Return the longest link that fits on an indented line, or None if not truncating."""
+    if terminal_columns is None:
+        return None
+    return max(terminal_columns - 4, 10)
 
 def main():
     parser = argparse.ArgumentParser(description="List SQS queues that have at least one message and update periodically.")
     parser.add_argument('-w', '--watch', nargs="?", const=60, type=int, metavar='n',
                         help="Update every [n] seconds. Default is 60 seconds if no value is provided.")
-    parser.add_argument('-t', '--workers', type=int, default=4, help="Number of thread workers for fetching queue info. Default is 4.")
+    parser.add_argument('-t', '--workers', type=int, default=10, help="Number of thread workers for fetching queue info. Default is 10.")
     parser.add_argument('-f', '--include-in-flight', action='store_true',
                         help="Include messages in flight (being processed) in the count.")
     parser.add_argument('-p', '--pattern', type=str, metavar='REGEX',
                         help="Filter queues by name using a regex pattern (searches queue name, not full URL).")
+    parser.add_argument('-b', '--backoff', action='store_true',
+                        help="In watch mode, poll queues that stay empty less often "
+                             f"(up to every {MAX_BACKOFF}th refresh).")
+    parser.add_argument('-l', '--truncate-links', action='store_true',
+                        help="Shorten console links to the terminal width so they don't wrap.")
     args = parser.parse_args()
+    if args.backoff and args.watch is None:
+        parser.error("--backoff requires --watch")
+
+    if args.truncate_links:
+        track_terminal_size()
 
     try:
+        sqs = create_sqs_client(args.workers)
         print("Reading list of queues...", end='', flush=True)
-        response = sqs.list_queues()
-        queue_urls = response.get('QueueUrls', [])
+        all_queues = list_queues(sqs)
+        console_prefix = console_link_prefix(sqs)
 
+        queues = filter_queues_by_pattern(all_queues, args.pattern)
         if args.pattern:
-            original_count = len(queue_urls)
-            queue_urls = filter_queues_by_pattern(queue_urls, args.pattern)
-            filtered_count = len(queue_urls)
+            original_count = len(all_queues)
+            filtered_count = len(queues)
             clear_line()
             print(f"Filtered {original_count} queues to {filtered_count} matching pattern '{args.pattern}'")
 
         if args.watch is None:
-            results = get_queue_infos(queue_urls, args.workers, args.include_in_flight)
-            display_results(results, args.include_in_flight)
+            results = get_queue_infos(sqs, queues, args.workers, args.include_in_flight)
+            display_results(results, console_prefix, args.include_in_flight, link_width_limit())
             # Exit with error code 1 if any messages were found
             if results:
                 sys.exit(1)
             return
+        # Maps queue URL to [backoff factor, refresh cycles left to skip]
+        backoff = {}
         while True:
-            results = get_queue_infos(queue_urls, args.workers, args.include_in_flight)
-            os.system('clear' if os.name == 'posix' else 'cls')
-            display_results(results, args.include_in_flight)
+            if args.backoff:
+                polled_queues = select_due_queues(queues, backoff)
+                results = get_queue_infos(sqs, polled_queues, args.workers, args.include_in_flight)
+                update_backoff(backoff, polled_queues, results)
+            else:
+                results = get_queue_infos(sqs, queues, args.workers, args.include_in_flight)
+            clear_screen()
+            display_results(results, console_prefix, args.include_in_flight, link_width_limit())
             if countdown(args.watch):
+                # A forced refresh polls every queue again
+                backoff.clear()
                 continue
     except KeyboardInterrupt:
         clear_line()